@@ -1,13 +1,20 @@
-from typing import Set, List, Dict
-from warnings import warn
+from typing import Set, List, Dict, Tuple, Optional
+from collections import defaultdict
 import asyncio
+import logging
 import discord
 from discord.ext import commands
 from .logger import logger
-from .simples import InteractionType, SlashWarning, _Route
+from .simples import InteractionType, _cached_route, _TTLCache
 from .command import Command, Group, cmd, group
 from .context import Context
 
+# command fields that are compared to decide whether to update a command,
+# cheapest first so that most mismatches skip the nested options compare
+_SYNC_KEYS = ('name', 'description', 'default_permission', 'options')
+# most per-guild requests to have in flight at once
+_MAX_CONCURRENT_REQUESTS = 50
+
 class SlashBot(commands.Bot):
     """A bot that supports slash commands.
 
@@ -25,6 +32,16 @@ class SlashBot(commands.Bot):
     :param bool fetch_if_not_get:
         If :const:`False` (the default), Discord objects passed in arguments
         will not be fetched from the API if retrieving them from cache fails.
+    :param float fetch_cache_ttl:
+        How long, in seconds, to remember Discord objects fetched for
+        arguments, so that repeat interactions do not fetch them again.
+        Members are never remembered, since their roles may have changed.
+        Defaults to 300. Set to 0 to always fetch.
+    :param bool bulk_overwrite:
+        If :const:`True`, :meth:`register_commands` replaces all commands
+        in each guild (and globally) with one request per guild, instead of
+        comparing them to the registered ones and only creating, updating
+        or deleting the ones that differ. Defaults to :const:`False`.
 
     .. attribute:: app_info
         :type: discord.AppInfo
@@ -35,7 +52,9 @@ class SlashBot(commands.Bot):
         :type: set[Command]
 
         All top-level :class:`Command` and :class:`Group` objects currently
-        registered **in code**.
+        registered **in code**. Prefer :meth:`add_slash` and
+        :meth:`remove_slash` to changing this set directly; direct changes
+        are only noticed when an interaction misses the lookup tables.
 
     .. decoratormethod:: slash_cmd(**kwargs)
 
@@ -48,13 +67,41 @@ class SlashBot(commands.Bot):
     """
 
     slash: Set[Command]
+    _slash_by_id: Dict[int, Command]
+    _slash_by_name_guild: Dict[Tuple[str, Optional[int]], Command]
+    _slash_by_name: Dict[str, Command]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.debug_guild = int(kwargs.pop('debug_guild', 0) or 0) or None
         self.resolve_not_fetch = bool(kwargs.pop('resolve_not_fetch', True))
         self.fetch_if_not_get = bool(kwargs.pop('fetch_if_not_get', False))
+        self._fetch_cache = _TTLCache(
+            2048, float(kwargs.pop('fetch_cache_ttl', 300)))
+        self.bulk_overwrite = bool(kwargs.pop('bulk_overwrite', False))
+        # unknown command IDs from interactions that triggered a resync,
+        # so that each is only resynced and warned about once an hour
+        self._resynced_ids = _TTLCache(256, 3600)
+        self._resync_task = None
+        # held by whichever register_commands call is talking to the API
+        self._sync_lock = asyncio.Lock()
+        # whether a register_commands call has finished (IDs are filled in)
+        self._commands_synced = False
+        # IDs of guilds the bot is in, built on first use
+        self._guild_ids: Optional[Set[int]] = None
+        @self.listen()
+        async def on_guild_join(guild: discord.Guild):
+            if self._guild_ids is not None:
+                self._guild_ids.add(guild.id)
+        @self.listen()
+        async def on_guild_remove(guild: discord.Guild):
+            if self._guild_ids is not None:
+                self._guild_ids.discard(guild.id)
         self.slash = set()
+        # lookup tables for dispatching interactions to commands
+        self._slash_by_id = {}
+        self._slash_by_name_guild = {}
+        self._slash_by_name = {}
         @self.listen()
         async def on_ready():
             self.remove_listener(on_ready)
@@ -69,10 +116,40 @@ class SlashBot(commands.Bot):
                 asyncio.create_task(self.close())
                 raise
 
+    def _index_command(self, cmd: Command):
+        if cmd.id is not None:
+            self._slash_by_id[cmd.id] = cmd
+        self._slash_by_name_guild[cmd.name, cmd.guild_id] = cmd
+        self._slash_by_name[cmd.name] = cmd
+
+    def _unindex_command(self, cmd: Command):
+        # only drop entries that still point at this command
+        for table, key in (
+            (self._slash_by_id, cmd.id),
+            (self._slash_by_name_guild, (cmd.name, cmd.guild_id)),
+            (self._slash_by_name, cmd.name),
+        ):
+            if table.get(key) is cmd:
+                del table[key]
+
+    def _set_command_id(self, cmd: Command, cmd_id: int):
+        if self._slash_by_id.get(cmd.id) is cmd:
+            del self._slash_by_id[cmd.id]
+        cmd.id = cmd_id
+        self._index_command(cmd)
+
+    def _reindex_commands(self):
+        self._slash_by_id.clear()
+        self._slash_by_name_guild.clear()
+        self._slash_by_name.clear()
+        for cmd in self.slash:
+            self._index_command(cmd)
+
     def slash_cmd(self, **kwargs):
         def decorator(func):
             cmd = Command(func, **kwargs)
             self.slash.add(cmd)
+            self._index_command(cmd)
             return cmd
         return decorator
 
@@ -83,6 +160,7 @@ class SlashBot(commands.Bot):
         """
         if isinstance(func, Command):
             self.slash.add(func)
+            self._index_command(func)
         else:
             self.slash_cmd(**kwargs)(func)
 
@@ -90,6 +168,7 @@ class SlashBot(commands.Bot):
         def decorator(func):
             group = Group(func, **kwargs)
             self.slash.add(group)
+            self._index_command(group)
             return group
         return decorator
 
@@ -97,18 +176,41 @@ class SlashBot(commands.Bot):
         """Non-decorator version of :meth:`slash_group`."""
         self.slash_group(**kwargs)(func)
 
+    def remove_slash(self, cmd: Command):
+        """Remove a top-level :class:`Command` or :class:`Group` from
+        :attr:`slash`, if present.
+
+        It stops being dispatched to immediately, and is deleted from the API
+        on the next :meth:`register_commands`.
+        """
+        self.slash.discard(cmd)
+        self._unindex_command(cmd)
+
     def add_slash_cog(self, cog: type):
         """Add all attributes of ``cog`` that are
         :class:`Command` or :class:`Group` instances.
 
         :param type cog: The cog to read attributes from.
         """
-        for key in dir(cog):
-            obj = getattr(cog, key)
-            if isinstance(obj, (Group, Command)):
-                obj.cog = cog
-                if obj.parent is None:
-                    self.slash.add(obj)
+        if isinstance(cog, type):
+            namespaces = cog.__mro__
+        elif hasattr(cog, '__dict__'):
+            namespaces = (cog,) + type(cog).__mro__
+        else:  # a cog instance with __slots__
+            namespaces = type(cog).__mro__
+        seen = set()
+        for namespace in namespaces:
+            for key, obj in vars(namespace).items():
+                # attributes of subclasses shadow those of base classes
+                if key in seen:
+                    continue
+                seen.add(key)
+                # Group is a subclass of Command
+                if isinstance(obj, Command):
+                    obj.cog = cog
+                    if obj.parent is None:
+                        self.slash.add(obj)
+                        self._index_command(obj)
 
     async def application_info(self):
         """Equivalent to :meth:`discord.Client.application_info`, but
@@ -123,28 +225,40 @@ class SlashBot(commands.Bot):
                 f'Interaction data version {event["version"]} is not supported'
                 ', please open an issue for this: '
                 'https://github.com/Kenny2github/discord-ext-slash/issues/new')
-        logger.debug('%s', event)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug('%s', event)
         if event['type'] != InteractionType.APPLICATION_COMMAND:
-            logger.debug('Ignoring non-slash command in main handler')
+            if debug:
+                logger.debug('Ignoring non-slash command in main handler')
             return
-        cmd = discord.utils.get(self.slash, id=int(event['data']['id']))
-        if cmd is None:
-            warn(f'No command {event["data"]["name"]!r} found '
-                 f'by ID {event["data"]["id"]}, falling back to '
-                 'name + guild search', SlashWarning)
-            cmd = discord.utils.get(
-                self.slash, name=event['data']['name'],
-                guild_id=int(event['guild_id'] or 0) or None)
+        guild_id = event.get('guild_id')
+        guild_id = int(guild_id) if guild_id else None
+        name = event['data']['name']
+        cmd_id = int(event['data']['id'])
+        cmd = self._slash_by_id.get(cmd_id)
+        if cmd is None or cmd.id != cmd_id or cmd not in self.slash:
+            # the tables can lag behind direct changes to self.slash
+            self._reindex_commands()
+            cmd = self._slash_by_id.get(cmd_id)
         if cmd is None:
-            warn(f'No command {event["data"]["name"]!r} found '
-                 f'by name and guild ID {event["guild_id"]!r}, '
-                 'falling back to name-only search', SlashWarning)
-            cmd = discord.utils.get(
-                self.slash, name=event['data']['name'])
+            cmd = self._slash_by_name_guild.get((name, guild_id))
+            if cmd is None:
+                cmd = self._slash_by_name.get(name)
+            found = 'found by name instead' if cmd is not None else 'nor by name'
+            if self._resynced_ids.get(cmd_id):
+                pass  # already warned about and resynced
+            elif self._resync_commands(cmd_id):
+                logger.warning('No command %r found by ID %s, %s; '
+                               'resyncing commands', name, cmd_id, found)
+            else:
+                logger.debug('No command %r found by ID %s, %s; '
+                             'commands are still being registered',
+                             name, cmd_id, found)
         if cmd is None:
             raise commands.CommandNotFound(
-                f'No command {event["data"]["name"]!r} found by any critera')
-        ctx: Context = await cmd._ctx_arg[1](self, cmd, event)
+                f'No command {name!r} found by any critera')
+        ctx: Context = await cmd._ctx_cls(self, cmd, event)
         self.dispatch('before_slash_command_invoke', ctx)
         try:
             await ctx.command.invoke(ctx)
@@ -160,6 +274,25 @@ class SlashBot(commands.Bot):
         else:
             self.dispatch('after_slash_command_invoke', ctx)
 
+    def _resync_commands(self, cmd_id: int) -> bool:
+        # resync at most once per unknown ID, and never more than once at a time;
+        # returns whether a resync was scheduled
+        if self._resynced_ids.get(cmd_id):
+            return False
+        # IDs are still being filled in, so nothing is actually missing yet
+        if not self._commands_synced or self._sync_lock.locked():
+            return False
+        if self._resync_task is not None and not self._resync_task.done():
+            return False
+        self._resynced_ids[cmd_id] = True
+        async def resync():
+            try:
+                await self.register_commands()
+            except discord.HTTPException:
+                logger.exception('Resyncing commands failed')
+        self._resync_task = asyncio.create_task(resync())
+        return True
+
     async def on_slash_permissions(self):
         await self.register_permissions()
 
@@ -169,30 +302,54 @@ class SlashBot(commands.Bot):
         :param int guild_id:
             Only update commands specific to this guild.
         """
+        # overlapping syncs would race to create the same commands
+        async with self._sync_lock:
+            try:
+                await self._register_commands(guild_id)
+            finally:
+                self._commands_synced = True
+
+    async def _register_commands(self, guild_id):
         app_info = await self.application_info()
         global_path = f"/applications/{app_info.id}/commands"
         guild_path = f"/applications/{app_info.id}/guilds/{{0}}/commands"
-        guilds = {g.id: {} for g in self.guilds if guild_id in {g.id, None}}
+        guilds = defaultdict(dict, {
+            g.id: {} for g in self.guilds
+            if guild_id is None or guild_id == g.id})
+        redirected = False
         for cmd in self.slash:
-            cmd.guild_id = cmd.guild_id or self.debug_guild
+            if cmd.guild_id is None and self.debug_guild is not None:
+                cmd.guild_id = self.debug_guild
+                redirected = True
             if guild_id and cmd.guild_id != guild_id:
                 continue
-            guilds.setdefault(cmd.guild_id, {})[cmd.name] = cmd
-        state = {
-            'POST': {},
-            'PATCH': {},
-            'DELETE': {}
+            guilds[cmd.guild_id][cmd.name] = cmd
+        if redirected:
+            # guild IDs are part of the hash; rehash in place so that
+            # references to this set stay valid
+            cmds = list(self.slash)
+            self.slash.clear()
+            self.slash.update(cmds)
+        # guild IDs may have been redirected to the debug guild
+        self._reindex_commands()
+        if self.bulk_overwrite:
+            await self._overwrite_cmds(guilds, global_path, guild_path)
+            return
+        state = {method: defaultdict(dict)
+                 for method in ('POST', 'PATCH', 'DELETE')}
+        routes = {
+            guild_id: _cached_route('GET', global_path if guild_id is None
+                                    else guild_path.format(guild_id))
+            for guild_id in guilds
         }
-        route = _Route('GET', global_path)
-        if None in guilds:
-            global_cmds = await self.http.request(route)
-            await self.sync_cmds(state, guilds[None], global_cmds, None)
-        for guild_id, guild in guilds.items():
-            if guild_id is None:
+        sem = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+        results = await asyncio.gather(
+            *(self._limited_request(sem, route) for route in routes.values()),
+            return_exceptions=True)
+        for guild_id, result in zip(routes, results):
+            if self._guild_request_failed(guild_id, result, 'Getting'):
                 continue
-            route = _Route('GET', guild_path.format(guild_id))
-            guild_cmds = await self.http.request(route)
-            await self.sync_cmds(state, guild, guild_cmds, guild_id)
+            await self.sync_cmds(state, guilds[guild_id], result, guild_id)
         del guilds
         tasks: List[asyncio.Task] = []
         for method, guilds in state.items():
@@ -204,40 +361,73 @@ class SlashBot(commands.Bot):
                         path = guild_path.format(guild_id)
                     if 'id' in kwargs:
                         path += f'/{kwargs.pop("id")}'
-                    route = _Route(method, path)
+                    route = _cached_route(method, path)
                     task = asyncio.create_task(self.process_command(
                         name, guild_id, route, kwargs))
                     tasks.append(task)
         await asyncio.gather(*tasks)
 
+    def _guild_request_failed(self, guild_id, result, action):
+        # a failure in one guild shouldn't stop the others from syncing,
+        # but failing to sync global commands is fatal
+        if not isinstance(result, BaseException):
+            return False
+        if guild_id is None or not isinstance(result, discord.HTTPException):
+            raise result
+        logger.error('%s commands in guild %s failed', action, guild_id,
+                     exc_info=result)
+        return True
+
+    async def _overwrite_cmds(self, guilds, global_path, guild_path):
+        routes = {
+            guild_id: _cached_route('PUT', global_path if guild_id is None
+                                    else guild_path.format(guild_id))
+            for guild_id in guilds
+        }
+        sem = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+        results = await asyncio.gather(*(
+            self._limited_request(sem, route, json=[
+                cmd.to_dict() for cmd in guilds[guild_id].values()])
+            for guild_id, route in routes.items()
+        ), return_exceptions=True)
+        for guild_id, result in zip(routes, results):
+            if self._guild_request_failed(guild_id, result, 'Overwriting'):
+                continue
+            logger.debug('PUT\tall commands\tin guild\t%s', guild_id)
+            guild = guilds[guild_id]
+            for data in result:
+                cmd = guild.get(data['name'])
+                if cmd is not None:
+                    self._set_command_id(cmd, int(data['id']))
+
     async def sync_cmds(self, state, todo, done, guild_id):
         # todo - registered in code
         # done - registered on API
         done = {data['name']: data for data in done}
         # in the API but not in code
-        to_delete = set(done.keys()) - set(todo.keys())
+        to_delete = done.keys() - todo.keys()
         # in both, filtering done later to see which ones to update
-        to_update = set(done.keys()) & set(todo.keys())
+        to_update = done.keys() & todo.keys()
         # in code but not in API
-        to_create = set(todo.keys()) - set(done.keys())
+        to_create = todo.keys() - done.keys()
         for name in to_create:
-            state['POST'].setdefault(guild_id, {})[name] \
+            state['POST'][guild_id][name] \
                 = {'json': todo[name].to_dict(), 'cmd': todo[name]}
         for name in to_update:
             cmd_dict = todo[name].to_dict()
-            up_to_date = all(done[name].get(k, ...) == cmd_dict.get(k, ...)
-                             for k in {'name', 'description',
-                                       'options', 'default_permission'})
+            done_dict = done[name]
+            up_to_date = all(done_dict.get(k) == cmd_dict.get(k)
+                             for k in _SYNC_KEYS)
             if up_to_date:
-                todo[name].id = int(done[name]['id'])
+                self._set_command_id(todo[name], int(done[name]['id']))
                 logger.debug('GET\t%s\t%s\tin guild\t%s', name, todo[name].id, guild_id)
             else:
                 cmd_dict.pop('name') # can't pass this to PATCH
-                state['PATCH'].setdefault(guild_id, {})[name] \
+                state['PATCH'][guild_id][name] \
                     = {'json': cmd_dict, 'id': int(done[name]['id']),
                        'cmd': todo[name]}
         for name in to_delete:
-            state['DELETE'].setdefault(guild_id, {})[name] \
+            state['DELETE'][guild_id][name] \
                 = {'id': int(done[name]['id'])}
 
     async def process_command(self, name, guild_id, route, kwargs):
@@ -250,7 +440,7 @@ class SlashBot(commands.Bot):
         finally:
             logger.debug('%s\t%s\tin guild\t%s', route.method, name, guild_id)
         if cmd is not None:
-            cmd.id = int(data['id'])
+            self._set_command_id(cmd, int(data['id']))
 
     async def register_permissions(self, guild_id: int = None):
         """Update command permissions on the API.
@@ -268,33 +458,60 @@ class SlashBot(commands.Bot):
             raise
 
     async def _register_permissions(self, guild_id: int = None):
+        if not any(cmd.permissions for cmd in self.slash):
+            return # nothing would be sent anyway
         app_info = self.app_info
         guild_path = f"/applications/{app_info.id}/guilds/{{0}}/commands/permissions"
-        all_guild_ids = {g.id for g in self.guilds} | {cmd.guild_id for cmd in self.slash}
+        if self._guild_ids is None:
+            self._guild_ids = {g.id for g in self.guilds}
+        all_guild_ids = self._guild_ids | {cmd.guild_id for cmd in self.slash}
         all_guild_ids.discard(None)
-        guilds: Dict[int, List[dict]] = {}
+        if guild_id is not None:
+            all_guild_ids &= {guild_id}
+        guilds: Dict[int, List[dict]] = defaultdict(list)
         for cmd in self.slash:
             defaults = cmd.perms_dict(None)
             if defaults['permissions']:
                 # don't set defaults in all guilds if the command itself
                 # is limited to only one guild
-                guild_ids = all_guild_ids if cmd.guild_id is None else {cmd.guild_id}
-                for gid in guild_ids:
-                    # This is only for guilds that have no specific perms.
-                    # Guilds that do have specific perms will have the default
-                    # perms included in (and updated by) the specific ones.
-                    # So if the guild from the overall list has specific perm
-                    # overrides, skip it here.
-                    if guild_id not in {gid, None} or gid in cmd.permissions:
-                        continue
-                    guilds.setdefault(gid, []).append(defaults)
+                if cmd.guild_id is None:
+                    guild_ids = all_guild_ids
+                else:
+                    guild_ids = all_guild_ids & {cmd.guild_id}
+                # This is only for guilds that have no specific perms.
+                # Guilds that do have specific perms will have the default
+                # perms included in (and updated by) the specific ones.
+                # So if the guild from the overall list has specific perm
+                # overrides, skip it here.
+                for gid in guild_ids - cmd.permissions.keys():
+                    guilds[gid].append(defaults)
             for gid in cmd.permissions:
                 if gid is None:
                     continue # don't actually pass None into the API
-                if guild_id not in {gid, None}:
+                if guild_id is not None and guild_id != gid:
                     continue
-                guilds.setdefault(gid, []).append(cmd.perms_dict(gid))
-        for guild_id, data in guilds.items():
-            route = _Route('PUT', guild_path.format(guild_id))
-            logger.debug('PUT\tpermissions for all commands\tin guild\t%s', guild_id)
-            await self.http.request(route, json=data)
+                guilds[gid].append(cmd.perms_dict(gid))
+        sem = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+        results = await asyncio.gather(*(
+            self._put_permissions(
+                sem, guild_path.format(guild_id), guild_id, data)
+            for guild_id, data in guilds.items()
+        ), return_exceptions=True)
+        errors = []
+        for guild_id, result in zip(guilds, results):
+            if isinstance(result, BaseException):
+                logger.error('Setting permissions in guild %s failed',
+                             guild_id, exc_info=result)
+                errors.append(result)
+        if errors:
+            raise errors[0]
+
+    async def _limited_request(self, sem, route, **kwargs):
+        # per-guild requests go through this so that a bot in many guilds
+        # doesn't open thousands of requests at once
+        async with sem:
+            return await self.http.request(route, **kwargs)
+
+    async def _put_permissions(self, sem, path, guild_id, data):
+        await self._limited_request(sem, _cached_route('PUT', path), json=data)
+        logger.debug('PUT\tpermissions for all commands\tin guild\t%s', guild_id)
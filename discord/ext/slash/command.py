@@ -1,7 +1,12 @@
 from __future__ import annotations
 import sys
-from typing import Coroutine, Optional, Mapping, Union, Dict, Tuple
-from functools import partial
+from datetime import datetime
+import logging
+from typing import (
+    Coroutine, Optional, Mapping, Union, Dict, Tuple, List, Callable, Iterable
+)
+from functools import partial, lru_cache
+from itertools import chain
 from inspect import signature
 import discord
 from discord.ext import commands
@@ -13,7 +18,36 @@ from .simples import (
 from .option import Option
 from .context import Context
 
-class Command(discord.Object):
+# attributes that change the output of to_dict()
+_PAYLOAD_ATTRS = frozenset({
+    'name', 'description', 'default_permission', 'options', 'parent', 'slash'
+})
+# attributes that change how this command and its subcommands are run
+_DISPATCH_ATTRS = frozenset({'parent', 'cog', 'coro', '_check'})
+
+async def _noop_check(*args, **kwargs):
+    pass
+
+_ANN_OTHER, _ANN_CONTEXT, _ANN_CHOICE, _ANN_OPTION = range(4)
+
+def _classify_annotation(typ) -> int:
+    """Sort a parameter annotation into one of the ``_ANN_*`` kinds."""
+    if isinstance(typ, Option):
+        return _ANN_OPTION
+    if isinstance(typ, type):
+        if issubclass(typ, Context):
+            return _ANN_CONTEXT
+        if issubclass(typ, ChoiceEnum):
+            return _ANN_CHOICE
+    return _ANN_OTHER
+
+@lru_cache(maxsize=None)
+def _compile_annotation(annotation: str):
+    # the same annotation strings recur across commands (and reloads),
+    # and code objects don't depend on the globals they're evaluated in
+    return compile(annotation, '<annotation>', 'eval')
+
+class Command:
     """Represents a slash command.
 
     The following constructor argument does not map to an attribute:
@@ -92,7 +126,17 @@ class Command(discord.Object):
 
         Set this command's check to this coroutine.
     """
-    cog = None
+    __slots__ = (
+        'cog', 'coro', 'id', 'name', 'description', 'guild_id', 'parent',
+        'options', 'default', 'default_permission', 'permissions',
+        '_check', '_ctx_arg', '_ctx_cls', '_name_to_key',
+        '_cached_dict', '_options_payload', '_check_chain_static',
+        '_parent_invocations', '_qualname', '__weakref__',
+        # still allow user code to set its own attributes on commands
+        '__dict__'
+    )
+
+    cog: Optional[type]
     coro: Coroutine
     id: Optional[int]
     name: str
@@ -100,106 +144,174 @@ class Command(discord.Object):
     guild_id: Optional[int]
     parent: Optional[Group]
     options: Mapping[str, Option]
-    default: bool = False
-    default_permission: bool = True
+    default: bool
+    default_permission: bool
     permissions: CommandPermissionsDict
+    _cached_dict: Optional[dict]
+    _options_payload: Optional[List[dict]]
+    _check_chain_static: Optional[Tuple[Callable, ...]]
+    _parent_invocations: Optional[Tuple[Callable, ...]]
+    _qualname: Optional[str]
 
     def __init__(self, coro: Coroutine, **kwargs):
+        self._cached_dict = None
+        self._options_payload = None
+        self._check_chain_static = None
+        self._parent_invocations = None
+        self._qualname = None
+        self.cog = None
+        self.default = False
         self.id = None
         self.name = kwargs.pop('name', coro.__name__)
         self.description = kwargs.pop('description', coro.__doc__)
         if not self.description:
             raise ValueError(f'Please specify a description for {self.name!r}')
-        self.guild_id = kwargs.pop('guild_id', kwargs.pop('guild', None))
-        if self.guild_id is not None:
-            self.guild_id = int(self.guild_id)
+        guild_id = kwargs.pop('guild_id', None)
+        if guild_id is None:
+            guild_id = kwargs.pop('guild', None)
+        self.guild_id = None if guild_id is None else int(guild_id)
         self.parent = kwargs.pop('parent', None)
         self.default_permission = kwargs.pop('default_permission', True)
         self.permissions = {}
         self._ctx_arg = None
         self.options = {}
         found_self_arg = False
+        # evaluate string annotations in the function's module's context
+        globs = getattr(coro, '__globals__', None)
+        if globs is None:
+            module = sys.modules.get(coro.__module__)
+            globs = getattr(module, '__dict__', {})
         for param in signature(coro).parameters.values():
             typ = param.annotation
             if isinstance(typ, str):
                 try:
-                    # evaluate the annotation in its module's context
-                    globs = sys.modules[coro.__module__].__dict__
-                    typ = eval(typ, globs)
+                    typ = eval(_compile_annotation(typ), globs)
                 except:
                     typ = param.empty
-            if (
-                not (isinstance(typ, Option) or (isinstance(typ, type) and (
-                    issubclass(typ, ChoiceEnum) or issubclass(typ, Context))))
-                and param.default is param.empty
-            ):
+            kind = _classify_annotation(typ)
+            if kind == _ANN_CONTEXT:
+                self._ctx_arg = param.name
+                self._ctx_cls = typ
+            elif kind != _ANN_OTHER:
+                if kind == _ANN_CHOICE:
+                    typ = Option(description=typ)
+                typ = typ.clone()
+                if param.default is param.empty:
+                    typ.required = True
+                self.options[param.name] = typ
+                if typ.name is None:
+                    typ.name = param.name
+            elif param.default is param.empty:
                 if not found_self_arg:
                     # assume that the first required non-annotated argument
                     # is the self argument to a class' method
                     found_self_arg = True
-                    continue
                 else:
                     raise TypeError(
                         f'Command {self.name!r} cannot have a '
                         'required argument with no valid annotation')
-            try:
-                if issubclass(typ, Context):
-                    self._ctx_arg = (param.name, typ)
-                elif issubclass(typ, ChoiceEnum):
-                    typ = Option(description=typ)
-            except TypeError: # not even a class
-                pass
-            if isinstance(typ, Option):
-                typ = typ.clone()
-                if param.default is param.empty:
-                    typ.required = True
-                self.options[param.name] = typ
-                if typ.name is None:
-                    typ.name = param.name
         if self._ctx_arg is None:
             raise ValueError('One argument must be type-hinted slash.Context')
+        # API option names to argument names
+        self._name_to_key = {opt.name: key for key, opt in self.options.items()}
         self.coro = coro
-        async def check(*args, **kwargs):
-            pass
-        self._check = kwargs.pop('check', check)
+        self._check = kwargs.pop('check', _noop_check)
 
     @property
     def qualname(self) -> str:
         """Fully qualified name of command, including group names."""
-        if self.parent is None:
-            return self.name
-        return self.parent.qualname + ' ' + self.name
+        if self._qualname is None:
+            if self.parent is None:
+                self._qualname = self.name
+            else:
+                self._qualname = self.parent.qualname + ' ' + self.name
+        return self._qualname
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        """When this command was registered, or :const:`None` if it is not."""
+        if self.id is None:
+            return None
+        return discord.utils.snowflake_time(self.id)
 
     def __str__(self):
         return self.qualname
 
+    def __repr__(self):
+        return f'<{type(self).__name__} name={self.qualname!r} id={self.id}>'
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == 'options':
+            self._options_payload = None
+        elif name == 'name' or name == 'parent':
+            self._reset_qualname()
+        if name in _PAYLOAD_ATTRS:
+            self._mark_dirty()
+        if name in _DISPATCH_ATTRS:
+            self._invalidate_dispatch()
+
+    def _mark_dirty(self):
+        # parents include this command in their own payloads
+        cmd = self
+        while cmd is not None:
+            cmd._cached_dict = None
+            cmd = getattr(cmd, 'parent', None)
+
+    def _invalidate_dispatch(self):
+        self._check_chain_static = None
+        self._parent_invocations = None
+
+    def _reset_qualname(self):
+        self._qualname = None
+
     def __hash__(self):
+        # not the ID, which is filled in while commands sit in SlashBot.slash
         return hash((self.name, self.guild_id))
 
+    def __eq__(self, other):
+        if not isinstance(other, Command):
+            return NotImplemented
+        return (self.name, self.guild_id, self.id) \
+            == (other.name, other.guild_id, other.id)
+
     def _to_dict_common(self, data: dict):
         if self.parent is None:
             data['default_permission'] = self.default_permission
 
     def to_dict(self):
+        if self._cached_dict is None:
+            self._cached_dict = self._to_dict()
+        # shallow copy so that callers can add or remove keys
+        return dict(self._cached_dict)
+
+    def _to_dict(self):
         data = {
             'name': self.name,
             'description': self.description
         }
         if self.options:
-            data['options'] = [opt.to_dict() for opt in self.options.values()]
+            if self._options_payload is None:
+                self._options_payload = [
+                    opt.to_dict() for opt in self.options.values()]
+            data['options'] = self._options_payload
         self._to_dict_common(data)
         return data
 
     def perms_dict(self, guild_id: Optional[int]):
-        perms = []
-        final = self.permissions.get(None, {}).copy()
-        final.update(self.permissions.get(guild_id, {}).items())
-        for (oid, type), perm in final.items():
-            perms.append({
-                'id': oid,
-                'type': type.value,
-                'permission': perm
-            })
+        defaults = self.permissions.get(None)
+        overrides = self.permissions.get(guild_id)
+        if not overrides:
+            final = defaults or {}
+        elif not defaults:
+            final = overrides
+        else:
+            final = {**defaults, **overrides}
+        perms = [{
+            'id': oid,
+            'type': type.value,
+            'permission': perm
+        } for (oid, type), perm in final.items()]
         return {'id': self.id, 'permissions': perms}
 
     def add_perm(
@@ -244,6 +356,32 @@ class Command(discord.Object):
         :raises ValueError:
             if ``guild_id`` is unspecified but cannot be inferred.
         """
+        guild_id, key = self._perm_key(target, guild_id, type)
+        self.permissions.setdefault(guild_id, {})[key] = perm
+
+    def add_perms(self, entries: Iterable[Tuple[
+        Union[discord.Role, discord.abc.User, discord.Object], bool,
+        Optional[int], Optional[ApplicationCommandPermissionType]
+    ]]):
+        """Add several permission overrides at once.
+
+        :param entries:
+            ``(target, perm, guild_id, type)`` tuples, with the same meanings
+            as the arguments to :meth:`add_perm`. ``guild_id`` may be ``...``
+            and ``type`` may be :const:`None` to infer them as there.
+
+        :raises ValueError: under the same conditions as :meth:`add_perm`.
+            No overrides are added if any entry is invalid.
+        """
+        by_guild = {}
+        for target, perm, guild_id, type in entries:
+            guild_id, key = self._perm_key(target, guild_id, type)
+            by_guild.setdefault(guild_id, {})[key] = perm
+        for guild_id, perms in by_guild.items():
+            self.permissions.setdefault(guild_id, {}).update(perms)
+
+    @staticmethod
+    def _perm_key(target, guild_id, type):
         if type is None:
             if isinstance(target, discord.Role):
                 type = ApplicationCommandPermissionType.ROLE
@@ -258,15 +396,17 @@ class Command(discord.Object):
             else:
                 raise ValueError(
                     'Must specify guild_id if target is not a guilded object')
-        self.permissions.setdefault(guild_id, {})[target.id, type] = perm
+        return guild_id, (target.id, type)
 
     async def invoke(self, ctx):
         if not await self.can_run(ctx):
             raise commands.CheckFailure(
                 f'The check functions for {self.qualname} failed.')
-        logger.debug('User %s running, in guild %s channel %s, command: %s',
-                     ctx.author.id, ctx.guild or ctx.guild.id, ctx.channel.id,
-                     ctx.command.qualname)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'User %s running, in guild %s channel %s, command: %s',
+                ctx.author.id, ctx.guild and ctx.guild.id, ctx.channel.id,
+                ctx.command.qualname)
         await self.invoke_parents(ctx)
         if self.cog is not None:
             await self.coro(self.cog, **ctx.options)
@@ -278,6 +418,18 @@ class Command(discord.Object):
         return coro
 
     async def can_run(self, ctx):
+        if self._check_chain_static is None:
+            self._check_chain_static = self._build_check_chain()
+        if not self._check_chain_static and not ctx.client._checks:
+            return True
+        # client checks first, then highest level parent first
+        for check in chain(reversed(ctx.client._checks),
+                           self._check_chain_static):
+            if await check(ctx) is False:
+                return False
+        return True
+
+    def _build_check_chain(self) -> Tuple[Callable, ...]:
         parents = []  # highest level parent last
         cogs = []
         parent = self.parent
@@ -286,20 +438,24 @@ class Command(discord.Object):
                 if hasattr(parent.cog, 'cog_check'):
                     if parent.cog.cog_check not in cogs:
                         cogs.append(parent.cog.cog_check)
-                parents.append(partial(parent._check, parent.cog))
-            else:
+                if parent._check is not _noop_check:
+                    parents.append(partial(parent._check, parent.cog))
+            elif parent._check is not _noop_check:
                 parents.append(parent._check)
             parent = parent.parent
         parents.extend(cogs)
-        parents.extend(ctx.client._checks)
         parents.reverse()  # highest level parent first
-        parents.append(self._check)
-        for check in parents:
-            if await check(ctx) is False:
-                return False
-        return True
+        if self._check is not _noop_check:
+            parents.append(self._check)
+        return tuple(parents)
 
     async def invoke_parents(self, ctx):
+        if self._parent_invocations is None:
+            self._parent_invocations = self._build_parent_invocations()
+        for coro in self._parent_invocations:
+            await coro(ctx)
+
+    def _build_parent_invocations(self) -> Tuple[Callable, ...]:
         parents = []
         parent = self.parent
         while parent is not None:
@@ -309,8 +465,7 @@ class Command(discord.Object):
                 parents.append(parent.coro)
             parent = parent.parent
         parents.reverse()
-        for coro in parents:
-            await coro(ctx)
+        return tuple(parents)
 
 class Group(Command):
     """Represents a group of slash commands.
@@ -333,19 +488,49 @@ class Group(Command):
 
         See :meth:`SlashBot.slash_group`.
     """
-    cog = None
+    __slots__ = ('slash', '_flat')
+
     slash: Mapping[str, Union[Group, Command]]
+    _flat: Dict[Tuple[str, ...], Command]
 
     def __init__(self, coro: Coroutine, **kwargs):
         super().__init__(coro, **kwargs)
         self.slash = {}
+        # (subgroup, subcommand) name paths to leaf commands,
+        # so that dispatch doesn't have to walk the tree
+        self._flat = {}
+
+    def _invalidate_dispatch(self):
+        super()._invalidate_dispatch()
+        for sub in getattr(self, 'slash', {}).values():
+            sub._invalidate_dispatch()
+
+    def _reset_qualname(self):
+        super()._reset_qualname()
+        for sub in getattr(self, 'slash', {}).values():
+            sub._reset_qualname()
+
+    def _add_sub(self, sub: Command):
+        self.slash[sub.name] = sub
+        self._mark_dirty()
+        if isinstance(sub, Group):
+            paths = {(sub.name,) + path: leaf
+                     for path, leaf in sub._flat.items()}
+        else:
+            paths = {(sub.name,): sub}
+        group = self
+        while group is not None:
+            group._flat.update(paths)
+            paths = {(group.name,) + path: leaf
+                     for path, leaf in paths.items()}
+            group = group.parent
 
     def slash_cmd(self, **kwargs):
         kwargs['parent'] = self
         def decorator(func):
             cmd = Command(func, **kwargs)
             cmd.cog = self.cog
-            self.slash[cmd.name] = cmd
+            self._add_sub(cmd)
             return cmd
         return decorator
 
@@ -358,7 +543,7 @@ class Group(Command):
         def decorator(func):
             group = Group(func, **kwargs)
             group.cog = self.cog
-            self.slash[group.name] = group
+            self._add_sub(group)
             return group
         return decorator
 
@@ -366,22 +551,19 @@ class Group(Command):
         """See :meth:`SlashBot.add_slash_group`."""
         self.slash_group(**kwargs)(func)
 
-    def to_dict(self):
+    def _to_dict(self):
         data = {
             'name': self.name,
             'description': self.description
         }
         if self.slash:
-            data['options'] = []
+            group_t = ApplicationCommandOptionType.SUB_COMMAND_GROUP
+            cmd_t = ApplicationCommandOptionType.SUB_COMMAND
+            options = data['options'] = []
             for sub in self.slash.values():
                 ddict = sub.to_dict()
-                if isinstance(sub, Group):
-                    ddict['type'] = ApplicationCommandOptionType.SUB_COMMAND_GROUP
-                elif isinstance(sub, Command):
-                    ddict['type'] = ApplicationCommandOptionType.SUB_COMMAND
-                else:
-                    raise ValueError(f'What is a {type(sub).__name__} doing here?')
-                data['options'].append(ddict)
+                ddict['type'] = group_t if isinstance(sub, Group) else cmd_t
+                options.append(ddict)
         self._to_dict_common(data)
         return data
 
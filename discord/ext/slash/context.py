@@ -1,11 +1,16 @@
 from __future__ import annotations
 from typing import Union, Any, Mapping, Optional, Iterable, TYPE_CHECKING
+from itertools import islice
+from functools import lru_cache
+from warnings import warn
+import logging
+import asyncio
 import discord
 from discord.ext import commands
 from .logger import logger
 from .simples import (
-    _AsyncInit, _Route, ApplicationCommandOptionType, CallbackFlags,
-    InteractionCallbackType, PartialMember, PartialTextChannel,
+    _AsyncInit, _Route, _to_json, ApplicationCommandOptionType, CallbackFlags,
+    InteractionCallbackType, SlashWarning, PartialMember, PartialTextChannel,
     PartialCategoryChannel, PartialVoiceChannel, PartialRole
 )
 if TYPE_CHECKING:
@@ -13,6 +18,31 @@ if TYPE_CHECKING:
     from .command import Command, Group
     from .bot import SlashBot
 
+# option types whose values are snowflakes of Discord objects
+_OBJECT_OPTION_TYPES = frozenset({
+    ApplicationCommandOptionType.USER,
+    ApplicationCommandOptionType.CHANNEL,
+    ApplicationCommandOptionType.ROLE,
+    ApplicationCommandOptionType.MENTIONABLE,
+})
+# responses that consist of nothing but their type
+_BARE_CALLBACKS = {rtype: {'type': rtype.value}
+                   for rtype in InteractionCallbackType}
+_WEBHOOK_ORIGINAL = '/webhooks/%s/%s/messages/@original'
+_INTERACTION_CALLBACK = '/interactions/%s/%s/callback'
+_FALLBACK_RESOLVE = ', falling back to resolving'
+_FALLBACK_DEFAULT = ', falling back on default'
+_PARTIAL_CHANNELS = {
+    discord.TextChannel: PartialTextChannel,
+    discord.CategoryChannel: PartialCategoryChannel,
+    discord.VoiceChannel: PartialVoiceChannel,
+}
+
+@lru_cache(maxsize=None)
+def _channel_cls(ctype: int) -> type:
+    cls, _ = discord.channel._channel_factory(ctype)
+    return _PARTIAL_CHANNELS.get(cls, cls)
+
 class Context(discord.Object, _AsyncInit):
     """Object representing an interaction.
 
@@ -74,7 +104,7 @@ class Context(discord.Object, _AsyncInit):
     options: Mapping[str, Any]
     me: Union[discord.Member, discord.Object]
     client: SlashBot
-    webhook: Optional[discord.Webhook]
+    _webhook: Optional[discord.Webhook]
 
     @property
     def bot(self) -> SlashBot:
@@ -86,34 +116,66 @@ class Context(discord.Object, _AsyncInit):
         """The bot. Alias for :attr:`client`."""
         self.client = value
 
+    @property
+    def webhook(self) -> Optional[discord.Webhook]:
+        """Webhook used for sending followup messages."""
+        # only built when someone actually asks for it
+        if self._webhook is None and self._responded:
+            self._webhook = discord.Webhook.partial(
+                id=self.client.app_info.id, token=self.token, adapter=
+                discord.AsyncWebhookAdapter(
+                    self.client.http._HTTPClient__session))
+        return self._webhook
+
+    @webhook.setter
+    def webhook(self, value: Optional[discord.Webhook]):
+        """Webhook used for sending followup messages."""
+        self._webhook = value
+        self._responded = value is not None
+
     async def __init__(self, client: SlashBot, cmd: Command, event: dict):
         self.client = client
         self.command = cmd
         self.id = int(event['id'])
+        channel = self._try_get(
+            discord.Object(event['channel_id']), self.client.get_channel,
+            self.client.fetch_channel, 'channel')
         if event.get('guild_id', None):
-            self.guild = await self._try_get(
+            guild = self._try_get(
                 discord.Object(event['guild_id']), self.client.get_guild,
                 self.client.fetch_guild, 'guild')
+            self.guild, self.channel = await self._gather(guild, channel)
         else:
             self.guild = None
-        self.channel = await self._try_get(
-            discord.Object(event['channel_id']), self.client.get_channel,
-            self.client.fetch_channel, 'channel')
+            self.channel = await channel
+        if isinstance(self.guild, discord.Guild):
+            # skip the wrapper frames below when calling these
+            self._get_member = self.guild.get_member
+            self._fetch_member = self.guild.fetch_member
+        # attribute names to lookups that need the guild
+        pending = {}
         if event.get('member'):
             author = PartialMember(
                 data=event['member'], guild=self.guild,
                 state=self.client._connection)
-            self.author = await self._try_get(
+            pending['author'] = self._try_get(
                 author, self._get_member,
                 self._fetch_member, 'author-member')
         elif event.get('user'):
             author = discord.User(
                 state=self.client._connection, data=event['user'])
-            self.author = await self._try_get(
+            pending['author'] = self._try_get(
                 author, self.client.get_user,
                 self.client.fetch_user, 'author-user')
         else:
             self.author = None
+        self.me = getattr(self.guild, 'me', None)
+        if self.me is None:
+            pending['me'] = self._try_get(
+                discord.Object(self.client.user.id), self._get_member,
+                self._fetch_member, 'me-member')
+        for attr, obj in zip(pending, await self._gather(*pending.values())):
+            setattr(self, attr, obj)
         self.token = event['token']
         # construct options into function-friendly form
         await self._kwargs_from_options(
@@ -123,63 +185,72 @@ class Context(discord.Object, _AsyncInit):
                 'channels': {}, 'roles': {}
             })
         )
-        self.me = await self._try_get(
-            discord.Object(self.client.user.id), self._get_member,
-            self._fetch_member, 'me-member')
-        self.webhook = None
+        self._webhook = None
+        self._responded = False
+        self._routes = {}
 
     async def _kwargs_from_options(self, options, resolved):
+        # use duck typing to avoid circular imports
+        if hasattr(self.command, 'slash'):
+            # subcommand (group) options have no value, only nested options
+            path = []
+            while options and 'value' not in options[0]:
+                path.append(options[0]['name'])
+                options = options[0].get('options', [])
+            self.command = self.command._flat[tuple(path)]
         self.cog = self.command.cog
         kwargs = {}
+        # option keys to (type, ID) of the object they refer to,
+        # so that each object is looked up once and all lookups run together
+        pending = {}
         for opt in options:
             if 'value' in opt:
                 value = opt['value']
-                for k, v in self.command.options.items():
-                    if v.name == opt['name']:
-                        opt['name'] = k
-                        break
-                else:
-                    raise commands.CommandInvokeError(
-                        f'No such option: {opt["name"]!r}')
-                _enum = self.command.options[opt['name']]._enum
-                if _enum is not None:
-                    value = _enum.__members__[value]
-                opttype = self.command.options[opt['name']].type
                 try:
-                    opttype = ApplicationCommandOptionType(opttype)
-                except ValueError:
-                    pass # just use the new int
-                if opttype in {
-                    ApplicationCommandOptionType.USER,
-                    ApplicationCommandOptionType.CHANNEL,
-                    ApplicationCommandOptionType.ROLE,
-                    ApplicationCommandOptionType.MENTIONABLE,
-                }:
-                    value = discord.Object(value)
-                if opttype == ApplicationCommandOptionType.USER:
-                    value = await self._try_get_user(value, resolved)
-                elif opttype == ApplicationCommandOptionType.CHANNEL:
-                    value = await self._try_get_channel(value, resolved)
-                elif opttype == ApplicationCommandOptionType.ROLE:
-                    value = await self._try_get_role(value, resolved)
-                elif opttype == ApplicationCommandOptionType.MENTIONABLE:
-                    # mention less people by default, though no two objects
-                    # should have the same snowflake ID anyway
-                    value = await self._try_get_user(value, resolved, False)
-                    if type(value) is discord.Object:
-                        value = await self._try_get_role(value, resolved)
-                kwargs[opt['name']] = value
-            elif 'options' in opt:
-                self.command = self.command.slash[opt['name']]
-                await self._kwargs_from_options(opt['options'], resolved)
-                return
-        # use duck typing to avoid circular imports
-        if hasattr(self.command, 'slash'):
-            self.command = self.command.slash[opt['name']]
-            await self._kwargs_from_options(opt.get('options', []), resolved)
-        else:
-            kwargs[self.command._ctx_arg[0]] = self
-            self.options = kwargs
+                    key = self.command._name_to_key[opt['name']]
+                except KeyError:
+                    raise commands.CommandInvokeError(
+                        f'No such option: {opt["name"]!r}') from None
+                option = self.command.options[key]
+                if option._enum is not None:
+                    value = option._enum.__members__[value]
+                # IntEnum, so unknown raw int types compare fine here too
+                opttype = option.type
+                if opttype in _OBJECT_OPTION_TYPES:
+                    pending[key] = (opttype, int(value))
+                    continue
+                kwargs[key] = value
+        if pending:
+            refs = set(pending.values())
+            found = dict(zip(refs, await self._gather(*(
+                self._try_get_option(opttype, oid, resolved)
+                for opttype, oid in refs))))
+            for key, ref in pending.items():
+                kwargs[key] = found[ref]
+        kwargs[self.command._ctx_arg] = self
+        self.options = kwargs
+
+    async def _gather(self, *coros):
+        # lookups only go to the API if fetch_if_not_get is set; otherwise
+        # they finish without suspending and tasks would be pure overhead
+        if len(coros) > 1 and self.client.fetch_if_not_get:
+            return await asyncio.gather(*coros)
+        return [await coro for coro in coros]
+
+    async def _try_get_option(self, opttype, oid: int, resolved: dict):
+        value = discord.Object(oid)
+        if opttype == ApplicationCommandOptionType.USER:
+            return await self._try_get_user(value, resolved)
+        if opttype == ApplicationCommandOptionType.CHANNEL:
+            return await self._try_get_channel(value, resolved)
+        if opttype == ApplicationCommandOptionType.ROLE:
+            return await self._try_get_role(value, resolved)
+        # mentionable: mention less people by default, though no two
+        # objects should have the same snowflake ID anyway
+        value = await self._try_get_user(value, resolved, False)
+        if type(value) is discord.Object:
+            value = await self._try_get_role(value, resolved)
+        return value
 
     async def _try_get(
         self, default, get_method, fetch_method, typename, *,
@@ -187,62 +258,94 @@ class Context(discord.Object, _AsyncInit):
     ):
         fq = (not self.client.resolve_not_fetch) if fq is None else fq
         fng = self.client.fetch_if_not_get if fng is None else fng
+        debug = logger.isEnabledFor(logging.DEBUG)
+        sid = str(default.id)
+        # the payload only has the kinds of objects that were passed
+        objs = None if resolved is None else resolved.get(typename + 's', {})
+        in_payload = objs is not None and sid in objs
         # always try to get *something*
-        if fq or resolved is None \
-                or str(default.id) not in resolved[typename+'s']:
+        if fq or not in_payload:
             try:
                 obj = get_method(default.id)
-                if obj is None and fng:
-                    logger.debug(
-                        'Getting %s %s for interaction %s failed, '
-                        'falling back to fetching',
-                        typename, default.id, self.id)
+                # no need to fetch what Discord already sent us
+                if obj is None and fng and not in_payload:
+                    # members' roles decide permission checks, so never
+                    # serve them stale; always fetch them afresh
+                    if typename.endswith('member'):
+                        key = None
+                    else:
+                        guild = getattr(self, 'guild', None)
+                        key = (typename, guild and guild.id, default.id)
+                        obj = self.client._fetch_cache.get(key)
+                    if obj is not None:
+                        if debug:
+                            logger.debug(
+                                'Got previously fetched %s %s '
+                                'for interaction %s',
+                                typename, obj.id, self.id)
+                        return obj
+                    if debug:
+                        logger.debug(
+                            'Getting %s %s for interaction %s failed, '
+                            'falling back to fetching',
+                            typename, default.id, self.id)
                     obj = await fetch_method(default.id)
-                elif not fng:
+                elif obj is None:
                     raise ValueError
                 else:
-                    logger.debug(
-                        'Got %s %s for interaction %s',
-                        typename, obj.id, self.id)
+                    if debug:
+                        logger.debug(
+                            'Got %s %s for interaction %s',
+                            typename, obj.id, self.id)
                     return obj
             except discord.HTTPException:
-                logger.debug(
-                    'Fetching %s %s for interaction %s failed%s',
-                    typename, default.id, self.id,
-                    ', falling back to resolving'
-                    if resolved
-                    else ', falling back on default')
+                if debug:
+                    logger.debug(
+                        'Fetching %s %s for interaction %s failed%s',
+                        typename, default.id, self.id,
+                        _FALLBACK_RESOLVE if resolved else _FALLBACK_DEFAULT)
             except (AttributeError, ValueError):
-                logger.debug(
-                    'Getting %s %s for interaction %s failed%s',
-                    typename, default.id, self.id,
-                    ', falling back to resolving'
-                    if resolved
-                    else ', falling back on default')
+                if debug:
+                    logger.debug(
+                        'Getting %s %s for interaction %s failed%s',
+                        typename, default.id, self.id,
+                        _FALLBACK_RESOLVE if resolved else _FALLBACK_DEFAULT)
             else:
-                logger.debug(
-                    'Fetched %s %s for interaction %s',
-                    typename, obj.id, self.id)
+                if debug:
+                    logger.debug(
+                        'Fetched %s %s for interaction %s',
+                        typename, obj.id, self.id)
+                if key is not None:
+                    self.client._fetch_cache[key] = obj
                 return obj
-        if resolved is None:
+        if objs is None:
             return default
-        obj = resolved[typename+'s'].get(str(default.id), None)
+        obj = objs.get(sid)
         if obj is None:
+            if debug:
+                logger.debug(
+                    'Resolving %s %s for interaction %s failed',
+                    typename, default.id, self.id)
+            return default
+        if debug:
             logger.debug(
-                'Resolving %s %s for interaction %s failed',
+                'Resolved %s %s for interaction %s',
                 typename, default.id, self.id)
-            return default
-        logger.debug(
-            'Resolved %s %s for interaction %s',
-            typename, default.id, self.id)
         return resolve_method(obj)
 
     async def _try_get_user(
         self, value: discord.Object,
         resolved: dict, try_user: bool = True
     ):
+        if not self.client.resolve_not_fetch \
+                and isinstance(self.guild, discord.Guild):
+            # _try_get would look in the cache first anyway
+            member = self.guild.get_member(value.id)
+            if member is not None:
+                return member
+        sid = str(value.id)
         def resolve_member(member):
-            member['user'] = resolved['users'][str(value.id)]
+            member['user'] = resolved['users'][sid]
             return PartialMember(
                 data=member, guild=self.guild,
                 state=self.client._connection)
@@ -268,21 +371,18 @@ class Context(discord.Object, _AsyncInit):
             # Also can't use None here because position is
             # used as a sort key too.
             channel.setdefault('position', -1)
-            ctype = channel['type']
-            ctype, _ = discord.channel._channel_factory(ctype)
-            if ctype is discord.TextChannel:
-                ctype = PartialTextChannel
-            elif ctype is discord.CategoryChannel:
-                ctype = PartialCategoryChannel
-            elif ctype is discord.VoiceChannel:
-                ctype = PartialVoiceChannel
-            return ctype(state=self.client._connection,
-                            guild=self.guild, data=channel)
+            return _channel_cls(channel['type'])(
+                state=self.client._connection, guild=self.guild, data=channel)
         return await self._try_get(
             value, get_channel, self.client.fetch_channel, 'channel',
             resolve_method=resolve_channel, resolved=resolved)
 
     async def _try_get_role(self, value: discord.Object, resolved: dict):
+        if not self.client.resolve_not_fetch \
+                and isinstance(self.guild, discord.Guild):
+            role = self.guild.get_role(value.id)
+            if role is not None:
+                return role
         def get_role(oid):
             return self.guild.get_role(oid)
         def resolve_role(role):
@@ -315,7 +415,7 @@ class Context(discord.Object, _AsyncInit):
 
         :param str content: The content of the message.
         :param discord.Embed embed: Shorthand for ``respond(embeds=[embed])``
-        :param embeds: Up to 10 embeds (any more will be silently discarded)
+        :param embeds: Up to 10 embeds (any more will be discarded)
         :type embeds: Iterable[discord.Embed]
         :param discord.AllowedMentions allowed_mentions:
             Mirrors normal ``allowed_mentions`` in
@@ -339,56 +439,63 @@ class Context(discord.Object, _AsyncInit):
         """
         if deferred:
             rtype = InteractionCallbackType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE
-        content = str(content)
+        if type(content) is not str:
+            content = str(content)
         if embed and embeds:
             raise TypeError('Cannot specify both embed and embeds')
         if embed:
             embeds = [embed]
         if embeds:
-            embeds = [emb.to_dict() for emb, _ in zip(embeds, range(10))]
+            if hasattr(embeds, '__len__') and len(embeds) > 10:
+                warn(f'Discarding {len(embeds) - 10} embeds past the limit of 10',
+                     SlashWarning, stacklevel=2)
+            embeds = [emb.to_dict() for emb in islice(embeds, 10)]
         mentions = self.client.allowed_mentions
         if mentions is not None and allowed_mentions is not None:
             mentions = mentions.merge(allowed_mentions)
         elif allowed_mentions is not None:
             mentions = allowed_mentions
-        if self.webhook is not None:
+        # AllowedMentions is mutable, so serialize it on every response
+        if mentions is not None:
+            mentions = mentions.to_dict()
+        if self._responded:
             data = {}
             if content:
                 data['content'] = content
             if embeds:
                 data['embeds'] = embeds
             if mentions is not None:
-                data['allowed_mentions'] = mentions.to_dict()
-            path = f"/webhooks/{self.client.app_info.id}/{self.token}" \
-                "/messages/@original"
-            route = _Route('PATCH', path, channel_id=self.channel.id,
-                           guild_id=self.guild or self.guild.id)
+                data['allowed_mentions'] = mentions
+            route = self._original_route('PATCH')
         else:
-            data = {
-                'type': int(rtype)
-            }
+            if ephemeral:
+                flags = (flags or 0) | CallbackFlags.EPHEMERAL
             if content or embeds:
-                data['data'] = {'content': content}
+                data = {
+                    'type': int(rtype),
+                    'data': {'content': content}
+                }
+                if embeds:
+                    data['data']['embeds'] = embeds
+                if mentions is not None:
+                    data['data']['allowed_mentions'] = mentions
+                if flags:
+                    data['data']['flags'] = int(flags)
             elif rtype == InteractionCallbackType.CHANNEL_MESSAGE_WITH_SOURCE:
                 raise ValueError('sending channel message with no content')
-            if embeds:
-                data['data']['embeds'] = embeds
-            if mentions is not None:
-                data['data']['allowed_mentions'] = mentions.to_dict()
-            if ephemeral:
-                flags = (flags or 0) | CallbackFlags.EPHEMERAL
-            if flags:
-                data.setdefault('data', {})['flags'] = int(flags)
-            path = f"/interactions/{self.id}/{self.token}/callback"
+            elif flags:
+                data = {'type': int(rtype), 'data': {'flags': int(flags)}}
+            else:
+                # e.g. deferring; these payloads are never modified
+                data = _BARE_CALLBACKS.get(rtype) or {'type': int(rtype)}
+            path = _INTERACTION_CALLBACK % (self.id, self.token)
             route = _Route('POST', path, channel_id=self.channel.id,
-                           guild_id=self.guild or self.guild.id)
-            self.webhook = discord.Webhook.partial(
-                id=self.client.app_info.id, token=self.token, adapter=
-                discord.AsyncWebhookAdapter(self.client.http._HTTPClient__session))
+                           guild_id=self.guild and self.guild.id)
+            self._responded = True
         if isinstance(file, discord.File):
             form = []
             form.append({'name': 'payload_json',
-                         'value': discord.utils.to_json(data)})
+                         'value': _to_json(data)})
             form.append({
                 'name': 'file',
                 'value': file.fp,
@@ -401,11 +508,17 @@ class Context(discord.Object, _AsyncInit):
 
     async def delete(self):
         """Delete the original interaction response message."""
-        path = f"/webhooks/{self.client.app_info.id}/{self.token}" \
-            "/messages/@original"
-        route = _Route('DELETE', path, channel_id=self.channel.id,
-                       guild_id=self.guild or self.guild.id)
-        await self.client.http.request(route)
+        await self.client.http.request(self._original_route('DELETE'))
+
+    def _original_route(self, method: str) -> _Route:
+        # every edit of the response goes to the same path
+        route = self._routes.get(method)
+        if route is None:
+            path = _WEBHOOK_ORIGINAL % (self.client.app_info.id, self.token)
+            route = self._routes[method] = _Route(
+                method, path, channel_id=self.channel.id,
+                guild_id=self.guild and self.guild.id)
+        return route
 
     async def send(self, *args, **kwargs):
         """Send a message in the channel where the the command was run.
@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import Optional, List, Set, Union, Type
+from copy import copy
+from functools import lru_cache
+from typing import Optional, List, Set, Union, Type, Tuple
 import discord
 from .simples import ApplicationCommandOptionType, ChoiceEnum
 
@@ -100,32 +102,15 @@ class Option:
             self.type = ApplicationCommandOptionType.CHANNEL
         else:
             self.type = ApplicationCommandOptionType(type)
+        # max_value first, so that it takes precedence in inferring type
         if 'max_value' in kwargs:
-            self.max_value = kwargs.pop('max_value')
-            if self.type == ApplicationCommandOptionType.INTEGER:
-                self.max_value = int(self.max_value)
-            elif self.type == ApplicationCommandOptionType.NUMBER:
-                self.max_value = float(self.max_value)
-            elif isinstance(self.max_value, int):
-                self.type = ApplicationCommandOptionType.INTEGER
-            elif isinstance(self.max_value, float):
-                self.type = ApplicationCommandOptionType.NUMBER
+            self._set_bound('max_value', kwargs.pop('max_value'))
         if 'min_value' in kwargs:
-            self.min_value = kwargs.pop('min_value')
-            if self.type == ApplicationCommandOptionType.INTEGER:
-                self.min_value = int(self.min_value)
-            elif self.type == ApplicationCommandOptionType.NUMBER:
-                self.min_value = float(self.min_value)
-            elif isinstance(self.min_value, int):
-                self.type = ApplicationCommandOptionType.INTEGER
-            elif isinstance(self.min_value, float):
-                self.type = ApplicationCommandOptionType.NUMBER
+            self._set_bound('min_value', kwargs.pop('min_value'))
         if isinstance(description, str):
             self.description = description
         elif issubclass(description, ChoiceEnum):
-            kwargs['choices'] = [
-                Choice(desc.value, attr)
-                for attr, desc in description.__members__.items()]
+            kwargs['choices'] = _enum_choices(description)
             self._enum = description
             self.description = description.__doc__
             self.type = ApplicationCommandOptionType.STRING
@@ -136,6 +121,18 @@ class Option:
         else:
             self.choices = None
 
+    def _set_bound(self, attr: str, value: Union[int, float]):
+        # cast to a numeric type, or infer the type from the value
+        if self.type == ApplicationCommandOptionType.INTEGER:
+            value = int(value)
+        elif self.type == ApplicationCommandOptionType.NUMBER:
+            value = float(value)
+        elif isinstance(value, int):
+            self.type = ApplicationCommandOptionType.INTEGER
+        elif isinstance(value, float):
+            self.type = ApplicationCommandOptionType.NUMBER
+        setattr(self, attr, value)
+
     def __repr__(self):
         return ("Option(name={0.name!r}, type='{0.type!s}', description=..., "
                 'required={0.required}, choices={1})').format(
@@ -160,10 +157,15 @@ class Option:
         return data
 
     def clone(self):
-        value = type(self)(**self.to_dict())
-        if self._enum is not None:
-            value._enum = self._enum
-        return value
+        # choices and channel types are never mutated after construction,
+        # so they can be shared with the copy
+        return copy(self)
+
+@lru_cache(maxsize=None)
+def _enum_choices(enum: Type[ChoiceEnum]) -> Tuple[Choice, ...]:
+    # choices are never mutated, so every option using an enum can share them
+    return tuple(Choice(desc.value, attr)
+                 for attr, desc in enum.__members__.items())
 
 class Choice:
     """Represents one choice for an option value.
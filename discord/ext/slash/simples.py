@@ -1,5 +1,12 @@
 from enum import Enum, IntEnum, IntFlag
+from collections import OrderedDict
+from functools import lru_cache
+from time import monotonic
 import discord
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 class SlashWarning(UserWarning):
     """:mod:`discord.ext.slash`-specific warning type."""
@@ -145,6 +152,49 @@ class ChoiceEnum(Enum):
 class _Route(discord.http.Route):
     BASE = 'https://discord.com/api/v8'
 
+@lru_cache(maxsize=1024)
+def _cached_route(method: str, path: str) -> _Route:
+    # routes are never mutated after construction, so they can be shared
+    return _Route(method, path)
+
+if orjson is not None:
+    def _to_json(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+else:
+    _to_json = discord.utils.to_json
+
+class _TTLCache:
+    """Least-recently-used mapping whose entries expire after ``ttl`` seconds.
+    A ``ttl`` of 0 disables caching.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            expiry, value = self._data[key]
+        except KeyError:
+            return default
+        if expiry < monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self.ttl <= 0:
+            return
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
 class _AsyncInit:
     async def __new__(cls, *args, **kwargs):
         inst = super().__new__(cls)
@@ -1,4 +1,5 @@
-from re import match, S, sub
+from re import sub
+import ast
 import os
 from setuptools import setup
 
@@ -6,9 +7,13 @@ with open(os.path.join(os.path.dirname(__file__),
                        'discord', 'ext', 'slash',
                        '__init__.py'), 'r') as f:
     contents = f.read()
-longdesc = match('^([\'"])\\1{2}(.*?)\\1{3}', contents, S).group(2)
-version = match(r'[\s\S]*__version__[^\'"]+[\'"]([^\'"]+)[\'"]', contents).group(1)
-del contents
+module = ast.parse(contents)
+longdesc = ast.get_docstring(module, clean=False)
+version = next(
+    ast.literal_eval(node.value) for node in module.body
+    if isinstance(node, ast.Assign)
+    and any(getattr(t, 'id', None) == '__version__' for t in node.targets))
+del contents, module
 longdesc = sub(':class:`~?([^`]+)`', r'``\1``', longdesc)
 
 with open(os.path.join(os.path.dirname(__file__),
@@ -17,7 +22,8 @@ with open(os.path.join(os.path.dirname(__file__),
 
 with open(os.path.join(os.path.dirname(__file__),
                        'requirements.txt'), 'r') as f3:
-    requirements = f3.read().strip().splitlines()
+    requirements = [line.strip() for line in f3
+                    if line.strip() and not line.startswith('#')]
 
 setup(
     name="discord-ext-slash",
@@ -39,5 +45,6 @@ setup(
     keywords='discord slash commands',
     packages=["discord.ext.slash"],
     install_requires=requirements,
+    extras_require={'speed': ['orjson']},
     python_requires='>=3.7',
 )